@@ -2,38 +2,109 @@
 import argparse
 # Time measurement
 import time
-# Path sorting
-from functools import cmp_to_key
+# Progress output
+import sys
+# cairosvg feature detection
+import inspect
+# Parallel rendering
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 # SVG reading
+from functools import lru_cache
+from multiprocessing.util import Finalize
+import warnings
+import cairocffi as cairo
 import cairosvg
+import cairosvg.parser
+import cairosvg.surface
+try:
+    import resvg_py
+except ImportError:
+    resvg_py = None
+try:
+    import skia
+except ImportError:
+    skia = None
+try:
+    import glfw
+except ImportError:
+    glfw = None
+import numpy as np
 from PIL import Image
 from io import BytesIO
+from hashlib import blake2b
 # SWF reading
 from pathlib import Path
 from subprocess import call
-# PDF export from PNGs
+# PDF export from PNGs (fpdf2)
 from fpdf import FPDF
 
+# The PNGs are only intermediate files for the pdf, so favour encoding speed
+PNG_COMPRESS_LEVEL = 1
+# Write buffer of the pdf file. The pdf is currently written with a single
+# write() of the whole document, which bypasses the buffer, so it only has an
+# effect if the pdf is ever written in parts
+PDF_WRITE_BUFFER_SIZE = 1 << 20
+# Working set of one block of rows in the transparency blend, kept within L2 cache
+BLEND_TILE_BYTES = 256 * 1024
+# Progress messages are written to stdout in batches of at most this many
+# lines, at least every LOG_FLUSH_SECONDS and right after a failure
+LOG_FLUSH_EVERY = 100
+LOG_FLUSH_SECONDS = 1.0
+FORMAT_CREATED = "{:04d}/{:04d}: {} created. {:03.1f}s {:6d}m".format
+FORMAT_NOT_CREATED = "{:04d}/{:04d}: {} could not be created. {:03.1f}s {:6d}m".format
+FORMAT_ADDED = "{:04d}/{:04d}: {} added. {:03.1f}s {:6d}m".format
+FORMAT_ADDED_DUPLICATE = "{:04d}/{:04d}: {} added, same image as page {}. {:03.1f}s {:6d}m".format
+FORMAT_NOT_ADDED = "{:04d}/{:04d}: {} could not be added. {:03.1f}s {:6d}m".format
+FORMAT_ADDED_IMAGE = "{}/{}:{} {:19.1f}s {:6d}m".format
+# Older cairosvg versions can not paint the background while rendering
+CAIROSVG_HAS_BACKGROUND_COLOR = "background_color" in \
+    inspect.signature(cairosvg.surface.Surface.__init__).parameters
+# Cairo image surface reused across svg renders, replaced when the size changes
+_image_surface = None
+
 
 def convert_transparency_to_color(png_bytes_file,
                                   background_color):
     """
-    Removing transparency from PNG files for a faster pdf conversion
+    Removing transparency from PNG files for a faster pdf conversion.
+    Blends every pixel as (alpha * foreground + (255 - alpha) * background) / 255
+    in uint16 integer math, in blocks of rows sized by BLEND_TILE_BYTES so
+    the intermediates stay in cache.
 
     Source: http://stackoverflow.com/questions/9166400/convert-rgba-png-to-rgb-with-pil
-    Source: http://stackoverflow.com/a/9459208/284318
 
-    :type png_bytes_file -- PIL RGBA Image object
+    :type png_bytes_file -- PNG file contents as bytes
           background_color -- Tuple r, g, b (default 255, 255, 255 = white)
     """
-    png_file = Image.open(BytesIO(png_bytes_file))
-    png_file.load()  # needed for split()
-    image_without_alpha = Image.new('RGB',
-                                    png_file.size,
-                                    background_color)
-    image_without_alpha.paste(png_file,
-                              mask=png_file.split()[3])  # 3 is the alpha channel
-    return image_without_alpha
+    rgba = np.asarray(Image.open(BytesIO(png_bytes_file)).convert("RGBA"))
+    height, width = rgba.shape[:2]
+    background = np.array(background_color, dtype=np.uint16)
+    rgb = np.empty((height, width, 3), dtype=np.uint8)
+    # Bytes per pixel: 4 of RGBA input, 6 + 6 + 2 of uint16 scratch buffers
+    tile_rows = max(1, BLEND_TILE_BYTES // (18 * width))
+    blended = np.empty((tile_rows, width, 3), dtype=np.uint16)
+    background_part = np.empty((tile_rows, width, 3), dtype=np.uint16)
+    alpha = np.empty((tile_rows, width, 1), dtype=np.uint16)
+    for row in range(0, height, tile_rows):
+        rows = slice(row, row + tile_rows)
+        tile = rgba[rows]
+        tile_blended = blended[:len(tile)]
+        tile_background_part = background_part[:len(tile)]
+        tile_alpha = alpha[:len(tile)]
+        np.copyto(tile_alpha, tile[..., 3:4])
+        np.multiply(tile[..., :3], tile_alpha, out=tile_blended)
+        np.subtract(255, tile_alpha, out=tile_alpha)
+        np.multiply(tile_alpha, background, out=tile_background_part)
+        np.add(tile_blended, tile_background_part, out=tile_blended)
+        # Rounded division by 255: x / 255 == (x + 128 + ((x + 128) >> 8)) >> 8
+        tile_blended += 128
+        np.right_shift(tile_blended, 8, out=tile_background_part)
+        tile_blended += tile_background_part
+        tile_blended >>= 8
+        rgb[rows] = tile_blended
+    return Image.fromarray(rgb, "RGB")
 
 
 def crop_image(pil_image, x_size, y_size, crop_coords):
@@ -53,25 +124,365 @@ def crop_image(pil_image, x_size, y_size, crop_coords):
     return resized_cropped_image
 
 
-def path_sorter(a, b):
+class ReusedPNGSurface(cairosvg.surface.PNGSurface):
     """
-    Sorting paths to fix default sort order. This function
-    first respects the length and then the values to fix the order.
-    :return: -1 is a < b, 0 if a == b, 1 if a > b
-    :type: a PosixPath
-           b PosixPath
+    cairosvg PNG surface drawing into a cached cairo image surface instead
+    of allocating a new pixel buffer for every file. Only the surface of
+    the last size is kept in _image_surface, one per worker process. The
+    RGB24 format makes cairo write opaque RGB PNGs directly. The surface is
+    not cleared on reuse, cairosvg paints the opaque background_color over
+    all of it first.
     """
-    if len(a.stem) < len(b.stem):
-        return -1
-    elif len(a.stem) > len(b.stem):
-        return 1
-    elif len(a.stem) == len(b.stem):
-        if a.stem < b.stem:
-            return -1
-        elif a.stem > b.stem:
-            return 1
-        else:
-            return 0
+
+    def _create_surface(self, width, height):
+        global _image_surface
+        width = int(round(width))
+        height = int(round(height))
+        if (_image_surface is None
+                or _image_surface.get_width() != width
+                or _image_surface.get_height() != height):
+            _image_surface = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+        return _image_surface, width, height
+
+    def finish(self):
+        # Only write the pixels out, the cached surface stays usable
+        self.cairo.flush()
+        self.cairo.write_to_png(self.output)
+
+
+def svg_to_png(path, write_to, x_size, y_size, background_color, backend="cairo"):
+    """
+    Renders an svg file onto a solid background and writes it as an opaque
+    PNG, RGBA for resvg and RGB otherwise. All backends paint the background themselves while rasterizing, so no
+    separate blending pass is needed.
+
+    :type path -- PosixPath of the svg file
+          write_to -- filename or file object to write the PNG to
+          x_size -- X size in pixels
+          y_size -- Y size in pixels
+          background_color -- Tuple r, g, b
+          backend -- 'cairo', 'resvg' or 'skia-gpu'
+    """
+    background_hex = "#{:02x}{:02x}{:02x}".format(*background_color)
+    if backend == "resvg":
+        resvg_svg_to_png(path, write_to, background_hex)
+    elif backend == "skia-gpu":
+        skia_svg_to_png(path, write_to, x_size, y_size, background_color)
+    else:
+        cairo_svg_to_png(path, write_to, x_size, y_size, background_color, background_hex)
+
+
+def resvg_svg_to_png(path, write_to, background_hex):
+    """
+    Renders an svg file with resvg at its own size, at 96 dpi like cairosvg.
+    resvg has no parent container, so svgs sized in percent are rendered at
+    their viewBox size instead of relative to x_size and y_size.
+
+    :type path -- PosixPath of the svg file
+          write_to -- filename or file object to write the PNG to
+          background_hex -- background color as '#rrggbb'
+    """
+    png_file = resvg_py.svg_to_bytes(svg_path=str(path),
+                                     dpi=96.0,
+                                     background=background_hex)
+    # resvg always writes RGBA, the alpha channel is constant here and fpdf
+    # does not embed a fully opaque one, so the PNG is kept as it is
+    if hasattr(write_to, "write"):
+        write_to.write(png_file)
+    else:
+        with open(write_to, "wb") as png:
+            png.write(png_file)
+
+
+@lru_cache(maxsize=None)
+def skia_gl_context():
+    """
+    Creates an OpenGL backed skia context, made current through a hidden
+    glfw window. One context is created per process.
+    :return: skia.GrDirectContext, or None if no OpenGL context is available
+             (e.g. on headless systems or without glfw)
+    """
+    if glfw is None:
+        return None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        if not glfw.init():
+            return None
+        glfw.window_hint(glfw.VISIBLE, glfw.FALSE)
+        window = glfw.create_window(1, 1, "", None, None)
+    if not window:
+        glfw.terminate()
+        return None
+    # atexit does not run in forked worker processes, multiprocessing's
+    # finalizers do
+    Finalize(None, glfw.destroy_window, args=(window,), exitpriority=1)
+    Finalize(None, glfw.terminate, exitpriority=0)
+    glfw.make_context_current(window)
+    return skia.GrDirectContext.MakeGL()
+
+
+@lru_cache(maxsize=1)
+def skia_surface(x_size, y_size):
+    """
+    Returns the skia surface of the given size for this process, rendered on
+    the GPU if possible and falling back to a CPU raster surface otherwise.
+    Only the surface of the last size is kept.
+    :type x_size -- X size in pixels
+          y_size -- Y size in pixels
+    :return: skia.Surface
+    """
+    surface = None
+    context = skia_gl_context()
+    if context is not None:
+        surface = skia.Surface.MakeRenderTarget(context,
+                                                skia.Budgeted.kNo,
+                                                skia.ImageInfo.MakeN32Premul(x_size, y_size))
+    if surface is None:
+        surface = skia.Surface(x_size, y_size)
+    return surface
+
+
+def skia_svg_to_png(path, write_to, x_size, y_size, background_color):
+    """
+    Renders an svg file with skia at its own size, x_size and y_size are
+    only used for a width or height given in percent.
+
+    :type path -- PosixPath of the svg file
+          write_to -- filename or file object to write the PNG to
+          x_size -- X size of the parent container in pixels
+          y_size -- Y size of the parent container in pixels
+          background_color -- Tuple r, g, b
+    """
+    stream = skia.Stream.MakeFromFile(str(path))
+    svg = skia.SVGDOM.MakeFromStream(stream) if stream else None
+    if svg is None:
+        raise ValueError("Could not read " + str(path))
+    # An empty intrinsic size means the svg is sized relative to its container
+    intrinsic_size = svg.containerSize()
+    width = intrinsic_size.width() or x_size
+    height = intrinsic_size.height() or y_size
+    if intrinsic_size.isEmpty():
+        svg.setContainerSize(skia.Size(width, height))
+    surface = skia_surface(int(round(width)), int(round(height)))
+    canvas = surface.getCanvas()
+    canvas.clear(skia.Color(*background_color))
+    svg.render(canvas)
+    pixels = surface.makeImageSnapshot().toarray(colorType=skia.kRGBA_8888_ColorType)
+    pil_image = Image.fromarray(pixels[..., :3], "RGB")
+    pil_image.save(write_to, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+
+
+def cairo_svg_to_png(path, write_to, x_size, y_size, background_color, background_hex):
+    """
+    Renders an svg file with cairosvg at its own size, x_size and y_size
+    are used as the parent container size.
+
+    :type path -- PosixPath of the svg file
+          write_to -- filename or file object to write the PNG to
+          x_size -- X size of the parent container in pixels
+          y_size -- Y size of the parent container in pixels
+          background_color -- Tuple r, g, b
+          background_hex -- background_color as '#rrggbb'
+    """
+    if CAIROSVG_HAS_BACKGROUND_COLOR:
+        tree = cairosvg.parser.Tree(url=str(path))
+        surface = ReusedPNGSurface(tree, write_to, 96,
+                                   parent_width=x_size,   # 1190
+                                   parent_height=y_size,  # 1682
+                                   background_color=background_hex)
+        surface.finish()
+    else:
+        png_file = cairosvg.svg2png(url=str(path),
+                                    parent_height=y_size,
+                                    parent_width=x_size)
+        pil_image = convert_transparency_to_color(png_bytes_file=png_file,
+                                                  background_color=background_color)
+        pil_image.save(write_to, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+
+
+def spawn_and_wait(args):
+    """
+    Runs a command found on PATH and waits for it. posix_spawn avoids
+    duplicating the page tables of the calling process as fork() does,
+    platforms without it (e.g. Windows) use subprocess instead.
+    :type args: list of str, the command and its arguments
+    :return: exit code of the command, 1 if it was killed by a signal
+    """
+    if not hasattr(os, "posix_spawnp"):
+        return call(args)
+    pid = os.posix_spawnp(args[0], args, os.environ)
+    _, status = os.waitpid(pid, 0)
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    return 1
+
+
+class ProgressLog:
+    """
+    Collects progress messages and writes them to stdout in batches, see
+    LOG_FLUSH_EVERY and LOG_FLUSH_SECONDS. A failure is written right away
+    so it stays next to the error printed by the worker.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.last_flush = time.perf_counter()
+
+    def add(self, message, failed=False):
+        self.messages.append(message)
+        if (failed
+                or len(self.messages) >= LOG_FLUSH_EVERY
+                or time.perf_counter() - self.last_flush >= LOG_FLUSH_SECONDS):
+            self.flush()
+
+    def flush(self):
+        if self.messages:
+            sys.stdout.write("\n".join(self.messages) + "\n")
+            sys.stdout.flush()
+            self.messages.clear()
+        self.last_flush = time.perf_counter()
+
+
+def path_sort_key(path):
+    """
+    Sort key to fix default sort order. Paths are ordered
+    first by the length and then by the value of their stem,
+    so that e.g. 2.svg comes before 10.svg.
+    :return: tuple of stem length and stem
+    :type: path PosixPath
+    """
+    return len(path.stem), path.stem
+
+
+def _render_svg(path,
+                write_to,
+                x_size,
+                y_size,
+                crop_coords,
+                background_color,
+                backend,
+                palette):
+    """
+    Renders a single svg file into a PNG, cropping it and reducing it to
+    a 256 color palette if needed.
+    :type path: PosixPath of the svg file
+          write_to: filename or file object to write the PNG to
+          x_size: size in pixels,
+          y_size: size in pixels,
+          crop_coords: Dict of ints with top-left-bottom-right
+          background_color: Tuple r, g, b
+          backend: svg rendering backend, 'cairo', 'resvg' or 'skia-gpu'
+          palette: bool, quantize to an 8 bit palette PNG
+    """
+    if crop_coords or palette:
+        png_file = BytesIO()
+        svg_to_png(path, png_file, x_size, y_size, background_color, backend)
+        png_file.seek(0)
+        pil_image = Image.open(png_file)
+        if pil_image.mode != "RGB":
+            pil_image = pil_image.convert("RGB")
+        if crop_coords:
+            pil_image = crop_image(pil_image,
+                                   x_size,
+                                   y_size,
+                                   crop_coords)
+        if palette:
+            pil_image = pil_image.quantize(colors=256,
+                                           method=Image.FASTOCTREE,
+                                           dither=Image.NONE)
+        pil_image.save(write_to, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+    else:
+        svg_to_png(path, write_to, x_size, y_size, background_color, backend)
+
+
+def _render_svg_to_bytes(path,
+                         x_size,
+                         y_size,
+                         crop_coords,
+                         background_color,
+                         backend,
+                         palette):
+    """
+    Renders a single svg file into PNG bytes in memory. Runs in a worker process.
+    :type path: PosixPath of the svg file
+          x_size: size in pixels,
+          y_size: size in pixels,
+          crop_coords: Dict of ints with top-left-bottom-right
+          background_color: Tuple r, g, b
+          backend: svg rendering backend, 'cairo', 'resvg' or 'skia-gpu'
+          palette: bool, quantize to an 8 bit palette PNG
+    :return: tuple of file name, PNG bytes (None on failure), digest of
+             the PNG bytes and elapsed seconds
+    """
+    time_iteration_start = time.perf_counter()
+    png_file = BytesIO()
+    try:
+        _render_svg(path,
+                    png_file,
+                    x_size,
+                    y_size,
+                    crop_coords,
+                    background_color,
+                    backend,
+                    palette)
+        png_bytes = png_file.getvalue()
+        digest = blake2b(png_bytes, digest_size=16).digest()
+    except Exception as e:
+        print(str(e))
+        png_bytes = digest = None
+    return path.name, png_bytes, digest, time.perf_counter() - time_iteration_start
+
+
+def _render_one(path,
+                image_suffix,
+                x_size,
+                y_size,
+                crop_coords,
+                source_suffix,
+                background_color,
+                backend,
+                palette):
+    """
+    Converts a single swf or svg file into an image. Runs in a worker process.
+    :type path: PosixPath of the source file
+          image_suffix: str, e.g. 'png', and supported types by swfrender
+          x_size: size in pixels,
+          y_size: size in pixels,
+          crop_coords: Dict of ints with top-left-bottom-right
+          source_suffix: 'swf', or 'svg'
+          background_color: Tuple r, g, b
+          backend: svg rendering backend, 'cairo', 'resvg' or 'skia-gpu'
+          palette: bool, quantize svg renders to an 8 bit palette PNG
+    :return: tuple of output file name, result code (0 is success)
+             and elapsed seconds
+    """
+    time_iteration_start = time.perf_counter()
+    image_name = path.with_suffix("." + image_suffix).name
+    result = 0
+    if source_suffix == "svg":
+        try:
+            _render_svg(path,
+                        image_name,
+                        x_size,
+                        y_size,
+                        crop_coords,
+                        background_color,
+                        backend,
+                        palette)
+            result = 0
+        except Exception as e:
+            print(str(e))
+            result = 1
+    elif source_suffix == "swf":
+        try:
+            result = spawn_and_wait(["swfrender", path.name,
+                                     "-X", str(x_size),
+                                     "-Y", str(y_size),
+                                     "-o", image_name])
+        except OSError as e:
+            print(str(e))
+            result = 1
+    return image_name, result, time.perf_counter() - time_iteration_start
 
 
 def raw_to_images(image_suffix,
@@ -80,73 +491,55 @@ def raw_to_images(image_suffix,
                   crop_coords,
                   source_suffix,
                   background_color,
+                  backend="cairo",
+                  palette=False,
                   verbose=True):
     """
-    Converts multiple swf files into multiple images
+    Converts multiple swf files into multiple images, one worker process per core
     :type source_suffix: 'swf', or 'svg'
           image_suffix: str, e.g. 'png', and supported types by swfrender
           x_size: size in pixels,
           y_size: size in pixels,
+          backend: svg rendering backend, 'cairo', 'resvg' or 'skia-gpu'
+          palette: bool, quantize svg renders to an 8 bit palette PNG
           verbose: print execution information
     """
-    time_function_start = time.time()
+    time_function_start = time.perf_counter()
     if verbose:
         print("\n* Generating images *")
 
-    paths = [path for path in Path.cwd().iterdir()
-             if path.suffix == ("." + source_suffix)]
-    paths.sort(key=cmp_to_key(path_sorter))
+    extension = "." + source_suffix
+    with os.scandir() as entries:
+        paths = [Path(entry.name) for entry in entries
+                 if entry.name.endswith(extension)]
+    paths.sort(key=path_sort_key)
     number_of_paths = len(paths)
     if number_of_paths:
         counter = 1
+        progress_log = ProgressLog()
+        render = partial(_render_one,
+                         image_suffix=image_suffix,
+                         x_size=x_size,
+                         y_size=y_size,
+                         crop_coords=crop_coords,
+                         source_suffix=source_suffix,
+                         background_color=background_color,
+                         backend=backend,
+                         palette=palette)
 
-        for path in paths:
-            time_iteration_start = time.time()
-            result = 0
-            if source_suffix == "svg":
-                try:
-                    png_file = cairosvg.svg2png(url=str(path),
-                                                parent_height=y_size,  # 1682
-                                                parent_width=x_size)   # 1190
-                    pil_image = convert_transparency_to_color(png_bytes_file=png_file,
-                                                              background_color=background_color)
-                    if crop_coords:
-                        pil_image = crop_image(pil_image,
-                                               x_size,
-                                               y_size,
-                                               crop_coords)
-                    filename = str(path)[:-3] + image_suffix
-                    pil_image.save(fp=filename)
-
-                    result = 0
-                except Exception as e:
-                    print(str(e))
-                    result = 1
-            elif source_suffix == "swf":
-                result = call(["swfrender", path.name,
-                               "-X", str(x_size),
-                               "-Y", str(y_size),
-                               "-o", path.name[:-3] + image_suffix])
-            if verbose:
-                time_current = time.time()
-                if result == 0:
-                    msg = ("{:04d}/{:04d}: {}{} created. " +
-                          "{:03.1f}s {:6d}m").format(number_of_paths,
-                                                     counter,
-                                                     path.name[:-3],
-                                                     image_suffix,
-                                                     (time_current - time_iteration_start),
-                                                     int((time_current - time_function_start) / 60))
-                else:
-                    msg = ("{:04d}/{:04d}: {}{} could not be created. " +
-                          "{:03.1f}s {:6d}m").format(number_of_paths,
-                                                     counter,
-                                                     path.name[:-3],
-                                                     image_suffix,
-                                                     (time_current - time_iteration_start),
-                                                     int((time_current - time_function_start) / 60))
-                counter += 1
-                print(msg)
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for name, result, elapsed in executor.map(render, paths, chunksize=8):
+                if verbose:
+                    minutes = int((time.perf_counter() - time_function_start) / 60)
+                    if result == 0:
+                        progress_log.add(FORMAT_CREATED(number_of_paths, counter, name,
+                                                        elapsed, minutes))
+                    else:
+                        progress_log.add(FORMAT_NOT_CREATED(number_of_paths, counter, name,
+                                                            elapsed, minutes),
+                                         failed=True)
+                    counter += 1
+        progress_log.flush()
     else:
         if verbose:
             print("No " + source_suffix + " files were found.")
@@ -164,29 +557,33 @@ def images_to_pdf(image_suffix: str,
           verbose: print execution information
     :return fpdf object
     """
-    time_function_start = time.time()
+    time_function_start = time.perf_counter()
     if verbose:
         print("\n* Generating pdf from images *")
 
-    imagepaths = [path for path in Path.cwd().iterdir()
-                  if path.suffix == ("." + image_suffix)]
-    imagepaths.sort(key=cmp_to_key(path_sorter))
+    extension = "." + image_suffix
+    with os.scandir() as entries:
+        imagepaths = [Path(entry.name) for entry in entries
+                      if entry.name.endswith(extension)]
+    imagepaths.sort(key=path_sort_key)
     number_of_paths = len(imagepaths)
     if number_of_paths:
         counter = 1
+        progress_log = ProgressLog()
         pdf = FPDF(unit="pt",
                    format=[int(x_size), int(y_size)])
 
         for imagepath in imagepaths:
-            time_iteration_start = time.time()
+            time_iteration_start = time.perf_counter()
             pdf.add_page()
             pdf.image(imagepath.name, 0, 0)
             if verbose:
-                time_current = time.time()
-                print(str(counter) + "/" + str(number_of_paths) + ":" + imagepath.name +
-                      " {:19.1f}s".format(int(time_current - time_iteration_start)) +
-                      " {:6d}m".format(int((time_current - time_function_start) / 60)))
+                time_current = time.perf_counter()
+                progress_log.add(FORMAT_ADDED_IMAGE(counter, number_of_paths, imagepath.name,
+                                                    int(time_current - time_iteration_start),
+                                                    int((time_current - time_function_start) / 60)))
                 counter += 1
+        progress_log.flush()
     else:
         if verbose:
             print("No images were found.")
@@ -194,15 +591,93 @@ def images_to_pdf(image_suffix: str,
     return pdf
 
 
+def raw_to_pdf(x_size,
+               y_size,
+               crop_coords,
+               background_color,
+               backend="cairo",
+               palette=False,
+               verbose=True):
+    """
+    Converts multiple svg files into a single pdf. The rendered pages are
+    embedded from memory, no intermediate image files are written.
+    Identical pages are embedded once: fpdf2 keys in-memory images by
+    their content, so repeated pages reference the same image XObject.
+    :type x_size: size in pixels,
+          y_size: size in pixels,
+          crop_coords: Dict of ints with top-left-bottom-right
+          background_color: Tuple r, g, b
+          backend: svg rendering backend, 'cairo', 'resvg' or 'skia-gpu'
+          palette: bool, quantize svg renders to an 8 bit palette PNG
+          verbose: print execution information
+    :return fpdf object, None if no page could be rendered
+    """
+    time_function_start = time.perf_counter()
+    if verbose:
+        print("\n* Generating pdf from svg files *")
+
+    with os.scandir() as entries:
+        paths = [Path(entry.name) for entry in entries
+                 if entry.name.endswith(".svg")]
+    paths.sort(key=path_sort_key)
+    number_of_paths = len(paths)
+    if number_of_paths:
+        counter = 1
+        progress_log = ProgressLog()
+        first_page_of_digest = dict()
+        pdf = FPDF(unit="pt",
+                   format=[int(x_size), int(y_size)])
+        render = partial(_render_svg_to_bytes,
+                         x_size=x_size,
+                         y_size=y_size,
+                         crop_coords=crop_coords,
+                         background_color=background_color,
+                         backend=backend,
+                         palette=palette)
+
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for name, png_bytes, digest, elapsed in executor.map(render, paths, chunksize=8):
+                added = png_bytes is not None
+                if added:
+                    pdf.add_page()
+                    pdf.image(BytesIO(png_bytes), 0, 0)
+                    first_page = first_page_of_digest.setdefault(digest, pdf.page)
+                del png_bytes
+                if verbose:
+                    minutes = int((time.perf_counter() - time_function_start) / 60)
+                    if added and first_page != pdf.page:
+                        progress_log.add(FORMAT_ADDED_DUPLICATE(number_of_paths, counter, name,
+                                                                first_page, elapsed, minutes))
+                    elif added:
+                        progress_log.add(FORMAT_ADDED(number_of_paths, counter, name,
+                                                      elapsed, minutes))
+                    else:
+                        progress_log.add(FORMAT_NOT_ADDED(number_of_paths, counter, name,
+                                                          elapsed, minutes),
+                                         failed=True)
+                counter += 1
+        progress_log.flush()
+        if pdf.page == 0:
+            # fpdf2 would add a blank page on output, write nothing instead
+            pdf = None
+    else:
+        if verbose:
+            print("No svg files were found.")
+        pdf = None
+    return pdf
+
+
 def pdf_export_to_disk(pdf: FPDF):
     """
     Saves an FPDF object to the current working directory,
-    named after the current directory.
+    named after the current directory. fpdf2 serializes the whole
+    document into memory first, it is then written in one go.
     :type pdf: FPDF
     """
     if pdf:
         pdf_filename = Path.cwd().parts[-1] + ".pdf"
-        pdf.output(pdf_filename, dest="F")
+        with open(pdf_filename, "wb", buffering=PDF_WRITE_BUFFER_SIZE) as pdf_file:
+            pdf_file.write(pdf.output())
     else:
         pass
 
@@ -215,7 +690,7 @@ def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--mode",
                         help="1 - Generate images only, 2 - Generate PDF from existing images,"
-                             "3 - Generate images and PDF",
+                             "3 - Generate PDF (svg pages are embedded without writing images)",
                         type=int)
     parser.add_argument("--x_size",
                         help="X size of images and pdf in pixels",
@@ -245,6 +720,17 @@ def parse_args():
                         help="swf|svg")
     parser.add_argument("--background_color",
                         help="255.255.255")
+    parser.add_argument("--backend",
+                        help="svg rendering backend, cairo by default. resvg renders svgs sized in "
+                             "percent at their viewBox size instead of relative to x_size/y_size. "
+                             "skia-gpu falls back to the CPU if no OpenGL context is available",
+                        choices=("cairo", "resvg", "skia-gpu"))
+    parser.add_argument("--palette",
+                        help="Reduce svg renders to 256 colors for smaller images and pdf",
+                        action="store_true")
+    parser.add_argument("--quiet",
+                        help="Do not print progress information",
+                        action="store_true")
     args = parser.parse_args()
     return args
 
@@ -254,7 +740,8 @@ def process_with_args(args,
                       default_y_size,
                       default_source_suffix,
                       default_image_suffix,
-                      default_background_color):
+                      default_background_color,
+                      default_backend):
     """
     Calls the processing functions with the parsed and default arguments, if parsed
     arguments are missing.
@@ -263,82 +750,71 @@ def process_with_args(args,
           default_y_size: default size to use if none is parsed
           default_source_suffix: default suffix to use if none is parsed
           default_image_suffix: default suffix to use if none is parsed
+          default_backend: default svg rendering backend to use if none is parsed
     """
-    if args.x_size:
-        x_size = args.x_size
-    else:
-        x_size = default_x_size
-    if args.y_size:
-        y_size = args.y_size
-    else:
-        y_size = default_y_size
-    crop_coords = dict()
-    if args.crop_top or args.crop_left or args.crop_bottom or args.crop_right:
-        crop_coords = dict()
-        if args.crop_top:
-            crop_coords["top"] = args.crop_top
-        if args.crop_left:
-            crop_coords["left"] = args.crop_left
-        if args.crop_bottom:
-            crop_coords["bottom"] = args.crop_bottom
-        if args.crop_right:
-            crop_coords["right"] = args.crop_right
+    x_size = args.x_size or default_x_size
+    y_size = args.y_size or default_y_size
+    crop_coords = {side: value for side, value in (("top", args.crop_top),
+                                                   ("left", args.crop_left),
+                                                   ("bottom", args.crop_bottom),
+                                                   ("right", args.crop_right))
+                   if value}
     if args.image_format:
         print("Due to swftools currently only supporting png, image format is reset to png.")
-        image_suffix = default_image_suffix
-    else:
-        image_suffix = default_image_suffix
-    if args.source_format:
-        if args.source_format in ("swf", "svg"):
-            source_suffix = args.source_format
-        else:
-            print("Only swf or svg is supported, trying {} as default.".format(default_source_suffix))
-            source_suffix = default_source_suffix
-    else:
+    image_suffix = default_image_suffix
+    source_suffix = args.source_format or default_source_suffix
+    if source_suffix not in ("swf", "svg"):
+        print("Only swf or svg is supported, trying {} as default.".format(default_source_suffix))
         source_suffix = default_source_suffix
     if args.background_color:
-        background_color = tuple(args.background_color.split("."))
+        background_color = tuple(int(channel) for channel in args.background_color.split("."))
     else:
         background_color = default_background_color
+    backend = args.backend or default_backend
+    if (backend == "resvg" and resvg_py is None) or (backend == "skia-gpu" and skia is None):
+        print("The {} backend is not installed, trying cairo instead.".format(backend))
+        backend = "cairo"
+    verbose = not args.quiet
 
-    if args.mode:
-        if args.mode == 1:
-            raw_to_images(image_suffix=image_suffix,
-                          source_suffix=source_suffix,
-                          x_size=x_size,
-                          y_size=y_size,
-                          crop_coords=crop_coords,
-                          background_color=background_color)
-        elif args.mode == 2:
-            pdf = images_to_pdf(image_suffix=image_suffix,
-                                x_size=x_size,
-                                y_size=y_size)
-            pdf_export_to_disk(pdf=pdf)
-        elif args.mode == 3:
-            raw_to_images(image_suffix=image_suffix,
-                          source_suffix=source_suffix,
-                          x_size=x_size,
-                          y_size=y_size,
-                          crop_coords=crop_coords,
-                          background_color=background_color)
-            pdf = images_to_pdf(image_suffix=image_suffix,
-                                x_size=x_size,
-                                y_size=y_size)
-            pdf_export_to_disk(pdf=pdf)
-        else:
-            pass
-    else:
+    def images_only():
         raw_to_images(image_suffix=image_suffix,
                       source_suffix=source_suffix,
                       x_size=x_size,
                       y_size=y_size,
                       crop_coords=crop_coords,
-                      background_color=background_color)
+                      background_color=background_color,
+                      backend=backend,
+                      palette=args.palette,
+                      verbose=verbose)
+
+    def pdf_only():
         pdf = images_to_pdf(image_suffix=image_suffix,
                             x_size=x_size,
-                            y_size=y_size)
+                            y_size=y_size,
+                            verbose=verbose)
         pdf_export_to_disk(pdf=pdf)
 
+    def images_and_pdf():
+        if source_suffix == "svg":
+            pdf = raw_to_pdf(x_size=x_size,
+                             y_size=y_size,
+                             crop_coords=crop_coords,
+                             background_color=background_color,
+                             backend=backend,
+                             palette=args.palette,
+                             verbose=verbose)
+            pdf_export_to_disk(pdf=pdf)
+        else:
+            images_only()
+            pdf_only()
+
+    # No mode given means mode 3, unknown modes do nothing
+    process = {1: images_only,
+               2: pdf_only,
+               3: images_and_pdf}.get(args.mode or 3)
+    if process:
+        process()
+
 
 if __name__ == "__main__":
     default_source_suffix = "svg"
@@ -346,6 +822,7 @@ if __name__ == "__main__":
     default_x_size = 2480
     default_y_size = 3508
     default_background_color = (255, 255, 255)
+    default_backend = "cairo"
     default_crop_coords = None
 
     args = parse_args()
@@ -355,7 +832,8 @@ if __name__ == "__main__":
                           default_y_size=default_y_size,
                           default_image_suffix=default_image_suffix,
                           default_source_suffix=default_source_suffix,
-                          default_background_color=default_background_color)
+                          default_background_color=default_background_color,
+                          default_backend=default_backend)
     else:
         raw_to_images(image_suffix=default_image_suffix,
                       source_suffix=default_source_suffix,